@@ -10,6 +10,7 @@ from core.config import settings
 from core.exceptions import APIError
 from core.logging import setup_logging, get_logger
 from core.security import try_get_current_user_id
+from core.json_provider import OrjsonProvider
 
 # ==================== 0. 全局日志配置 ====================
 setup_logging()
@@ -41,6 +42,8 @@ import re
 
 # 初始化 Flask 应用
 app = Flask(__name__)
+# JSON 序列化使用 orjson (轮询段落等大响应)
+app.json = OrjsonProvider(app)
 # 允许跨域，动态匹配所有 Origin，避免写死 localhost 端口，并支持携带凭据(Cookie)
 CORS(app, resources={r"/api/*": {"origins": re.compile(r".*")}}, supports_credentials=True)
 
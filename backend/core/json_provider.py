@@ -0,0 +1,46 @@
+"""
+Flask JSON Provider：用 orjson 替代标准库 json
+
+行为与 Flask 默认 Provider 保持一致:
+- 键排序遵循 app.json.sort_keys，非字符串键转为字符串
+- 响应体末尾保留换行；compact 为 False，或未设置且处于 debug 时，缩进输出交给默认实现
+- datetime/date 仍交给 Flask 默认的 _default 处理 (HTTP 日期格式)，
+  Decimal / dataclass / __html__ 同样回退到 _default
+- 传入额外 json.dumps 参数时回退到标准库实现
+- orjson 无法编码的值 (如超出 64 位的整数) 回退到标准库实现，而不是抛错
+
+与默认实现的差异: 非 ASCII 字符直接以 UTF-8 输出 (不转义为 \\uXXXX)，解析结果等价
+"""
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    def _encode(self, obj) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._encode(obj).decode("utf-8")
+        except orjson.JSONEncodeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = self._encode(obj)
+        except orjson.JSONEncodeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
@@ -8,7 +8,9 @@
 4. Re-export jwt_required 供路由层直接使用
 """
 
+import re
 import uuid
+import functools
 import bcrypt
 from flask_jwt_extended import (
     create_access_token,
@@ -62,6 +64,36 @@ def decode_refresh_token(token: str) -> str:
 
 # ==================== 用户身份 ====================
 
+_NIL_UUID = uuid.UUID(int=0)
+_UUID_RE = re.compile(
+    r"\A[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\Z"
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def _cached_uuid(user_id: str) -> uuid.UUID:
+    """已通过格式校验的 UUID 字符串 → UUID (带缓存，同一用户的重复请求直接命中)"""
+    return uuid.UUID(user_id)
+
+
+def _parse_uuid(value: str) -> uuid.UUID | None:
+    """严格解析 UUID 字符串：先做格式校验，非法格式返回 None"""
+    if not _UUID_RE.match(value):
+        return None
+    return _cached_uuid(value)
+
+
+def parse_user_id(user_id: str) -> uuid.UUID | None:
+    """
+    将字符串形式的 user_id 解析为 UUID，不依赖异常做格式校验。
+    - 'default': 返回全零 UUID
+    - 非法格式: 返回 None
+    """
+    if user_id == "default":
+        return _NIL_UUID
+    return _parse_uuid(user_id)
+
+
 def try_get_current_user_id() -> uuid.UUID | None:
     """
     尝试从当前请求的 JWT 中解析 user_id。
@@ -72,7 +104,8 @@ def try_get_current_user_id() -> uuid.UUID | None:
         verify_jwt_in_request(optional=True)
         identity = get_jwt_identity()
         if identity:
-            return uuid.UUID(identity)
+            # JWT 身份必须是合法 UUID，不走 'default' 映射 (否则会被视为已登录)
+            return _parse_uuid(identity)
     except Exception:
         pass
     return None
@@ -0,0 +1,37 @@
+"""add pdf_paragraphs.word_count
+
+Revision ID: 5b1e7c2d9a40
+Revises: 638e26590804
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e7c2d9a40'
+down_revision = '638e26590804'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pdf_paragraphs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('word_count', sa.Integer(), nullable=True, comment='原文词数 (写入时计算)'))
+
+    # 回填已有段落 (与 Python str.split() 的空白分词一致)
+    op.execute(
+        r"""
+        UPDATE pdf_paragraphs
+        SET word_count = CASE
+            WHEN original_text ~ '^\s*$' THEN 0
+            ELSE array_length(regexp_split_to_array(regexp_replace(original_text, '^\s+|\s+$', '', 'g'), '\s+'), 1)
+        END
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('pdf_paragraphs', schema=None) as batch_op:
+        batch_op.drop_column('word_count')
@@ -61,6 +61,7 @@ class PdfParagraph(Base):
     # 文本内容
     original_text = Column(Text, nullable=False)
     translation_text = Column(Text, nullable=True, comment="翻译好的文本(可选)")
+    word_count = Column(Integer, nullable=True, comment="原文词数 (写入时计算)")
     
     # 坐标信息
     bbox = Column(JSONB, comment="[x, y, w, h] 归一化坐标")
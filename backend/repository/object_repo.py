@@ -1,5 +1,5 @@
 import logging
-from typing import Optional, Union, BinaryIO
+from typing import Optional
 from qcloud_cos import CosConfig as TencentCosConfig
 from qcloud_cos import CosS3Client
 from core.config import settings
@@ -35,10 +35,13 @@ class ObjectStorageRepository:
         else:
             logger.debug("COS is disabled in configuration.")
 
-    def upload_file(self, file_content: Union[bytes, str, BinaryIO], key: str, content_type: str = None) -> bool:
+    def upload_local_file(self, local_path: str, key: str, content_type: str = "application/pdf",
+                          part_size_mb: int = 20, max_threads: int = 8) -> bool:
         """
-        文件上传到 COS
-        :param file_content: 文件内容（字节、字符串或类文件对象）
+        从本地路径上传文件到 COS
+        大文件由 SDK 按 part_size_mb 分块并发 (max_threads) 分块上传，小文件走单次上传；
+        直接从磁盘读取，不整体载入内存
+        :param local_path: 本地文件路径
         :param key: 对象键（存储桶中的路径）
         :param content_type: 文件的 MIME 类型
         :return: 如果上传成功则返回 True，否则返回 False
@@ -46,15 +49,16 @@ class ObjectStorageRepository:
         if not self.client:
             logger.warning("COS client is not ready. Cannot upload file.")
             return False
-            
+
         try:
-            # CosS3Client.put_object 接受字符串、字节或流
-            self.client.put_object(
+            self.client.upload_file(
                 Bucket=self.config.bucket,
-                Body=file_content,
                 Key=key,
-                ContentType=content_type,
-                EnableMD5=False
+                LocalFilePath=local_path,
+                PartSize=part_size_mb,
+                MAXThread=max_threads,
+                EnableMD5=False,
+                ContentType=content_type
             )
             logger.info(f"Successfully uploaded file to COS: {key}")
             return True
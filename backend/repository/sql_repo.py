@@ -2,8 +2,8 @@ from typing import List, Dict, Optional, Any, Union
 import uuid
 from datetime import datetime
 from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import select, delete, update, func, and_, desc, asc
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import select, delete, update, func, and_, desc, asc, literal, String, Text
+from sqlalchemy.dialects.postgresql import insert, ARRAY
 
 # Using absolute imports
 from model.db.base import Base
@@ -18,6 +18,15 @@ from model.db.graph_models import (
     graph_paper_association, paper_node_link, note_node_link
 )
 
+# 在数据库侧把 timestamptz 格式化为 ISO 8601 (UTC) 字符串，省去 Python 端逐行 isoformat
+_ISO_UTC_FORMAT = 'YYYY-MM-DD"T"HH24:MI:SS.US"+00:00"'
+
+
+def _iso_utc(column, name: str):
+    """to_char(column AT TIME ZONE 'UTC', ...) AS name；NULL 原样返回 NULL"""
+    return func.to_char(func.timezone("UTC", column), _ISO_UTC_FORMAT).label(name)
+
+
 class SQLRepository:
     def __init__(self, db: Session):
         self.db = db
@@ -50,29 +59,32 @@ class SQLRepository:
     # ==================== PDF 管理 ====================
 
     def get_global_file(self, file_hash: str) -> Optional[GlobalFile]:
-        """根据文件哈希值获取全局文件记录"""
-        stmt = select(GlobalFile).where(GlobalFile.file_hash == file_hash)
-        return self.db.execute(stmt).scalar_one_or_none()
+        """
+        根据文件哈希值获取全局文件记录
+        按主键走 Session.get：同一请求 (会话) 内已加载且未过期的记录直接取自 identity map，
+        不再重复查询；提交后对象过期，下次访问自动重新加载
+        """
+        return self.db.get(GlobalFile, file_hash)
         
-    def create_global_file(self, file_hash: str, file_path: str, file_size: int = 0, total_pages: int = 0, metadata: Dict = None, dimensions: List[Dict] = None) -> GlobalFile:
-        """创建全局文件记录（如果已存在则返回现有记录）"""
-        existing = self.get_global_file(file_hash)
-        if existing:
-            return existing
-            
-        global_file = GlobalFile(
+    def add_global_file(self, file_hash: str, file_path: str, file_size: int = 0, total_pages: int = 0, metadata: Dict = None, dimensions: List[Dict] = None, task_id: str = None) -> bool:
+        """
+        插入新的全局文件记录 (INSERT ... ON CONFLICT DO NOTHING，不提交)
+        并发上传同一文件时不抛主键冲突，由调用方按查重命中处理并统一提交
+        :return: 是否由本次插入创建 (False 表示记录已被其他请求创建)
+        """
+        stmt = insert(GlobalFile).values(
             file_hash=file_hash,
             file_path=file_path,
             file_size=file_size,
             total_pages=total_pages,
             metadata_info=metadata or {},
             dimensions=dimensions or [],
-            process_status="pending" 
-        )
-        self.db.add(global_file)
-        self.db.commit()
-        self.db.refresh(global_file)
-        return global_file
+            process_status="pending",
+            task_id=task_id
+        ).on_conflict_do_nothing(
+            index_elements=[GlobalFile.file_hash]
+        ).returning(GlobalFile.file_hash)
+        return self.db.execute(stmt).scalar_one_or_none() is not None
 
     def get_user_paper(self, user_id: uuid.UUID, file_hash: str) -> Optional[UserPaper]:
         """获取用户的论文关联记录"""
@@ -181,15 +193,18 @@ class SQLRepository:
     def save_paragraphs(self, file_hash: str, paragraphs: List[Dict]):
         """
         批量保存PDF段落信息
-        paragraphs: 包含 page_number, paragraph_index, original_text, bbox 的字典列表
+        paragraphs: 包含 page_number, paragraph_index, original_text, bbox, word_count 的字典列表
         """
         objects = []
         for p in paragraphs:
+            original_text = p.get("original_text", "")
+            word_count = p.get("word_count")
             obj = PdfParagraph(
                 file_hash=file_hash,
                 page_number=p.get("page_number"),
                 paragraph_index=p.get("paragraph_index"),
-                original_text=p.get("original_text", ""),
+                original_text=original_text,
+                word_count=word_count if word_count is not None else len(original_text.split()),
                 bbox=p.get("bbox")
             )
             objects.append(obj)
@@ -209,16 +224,26 @@ class SQLRepository:
         stmt = stmt.order_by(PdfParagraph.page_number, PdfParagraph.paragraph_index)
         return self.db.execute(stmt).scalars().all()
 
-    def get_paragraphs_range(self, file_hash: str, start_page: int, end_page: int) -> List[PdfParagraph]:
-        """获取指定页码范围内的段落 (Inclusive)"""
-        stmt = select(PdfParagraph).where(
+    def get_paragraphs_range(self, file_hash: str, start_page: int, end_page: int) -> List[Any]:
+        """
+        获取指定页码范围内的段落 (Inclusive)
+        只取格式化所需的列，返回 Core 行 (属性名与 PdfParagraph 一致)，不构造 ORM 实例
+        """
+        stmt = select(
+            PdfParagraph.page_number,
+            PdfParagraph.paragraph_index,
+            PdfParagraph.original_text,
+            PdfParagraph.translation_text,
+            PdfParagraph.bbox,
+            PdfParagraph.word_count
+        ).where(
             and_(
                 PdfParagraph.file_hash == file_hash,
                 PdfParagraph.page_number >= start_page,
                 PdfParagraph.page_number <= end_page
             )
         ).order_by(PdfParagraph.page_number, PdfParagraph.paragraph_index)
-        return self.db.execute(stmt).scalars().all()
+        return self.db.execute(stmt).all()
 
     def get_paragraph_translations(self, file_hash: str, page_number: Optional[int] = None, paragraph_index: Optional[int] = None) -> List[Optional[str]]:
         """按文件哈希、页码或段落索引获取翻译文本列表"""
@@ -379,24 +404,58 @@ class SQLRepository:
 
     # ==================== 笔记 ====================
 
-    def add_note(self, user_paper_id: uuid.UUID, content: str, title: str = None, keywords: List[str] = None) -> UserNote:
-        """添加用户笔记"""
-        note = UserNote(
-            user_paper_id=user_paper_id,
-            title=title,
-            content=content,
-            keywords=keywords or []
+    def upsert_user_paper_and_add_note(self, user_id: uuid.UUID, file_hash: str, content: str, title: str = None,
+                                       keywords: List[str] = None, paper_title: str = "Reference Document") -> int:
+        """
+        确保 UserPaper 存在并添加笔记，单条语句完成 (一次往返 + 一次提交)
+        WITH up AS (INSERT INTO user_papers ... ON CONFLICT DO UPDATE RETURNING id)
+        INSERT INTO user_notes ... SELECT ... FROM up RETURNING id
+        """
+        paper_stmt = insert(UserPaper).values(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            file_hash=file_hash,
+            title=paper_title,
+            read_status="unread"
         )
-        self.db.add(note)
+        # DO UPDATE (而非 DO NOTHING) 保证冲突时 RETURNING 仍返回已有行的 id
+        up = paper_stmt.on_conflict_do_update(
+            constraint="uix_user_file",
+            set_={"user_id": paper_stmt.excluded.user_id}
+        ).returning(UserPaper.id).cte("up")
+
+        stmt = insert(UserNote).from_select(
+            ["user_paper_id", "title", "content", "keywords"],
+            select(
+                up.c.id,
+                literal(title, String),
+                literal(content, Text),
+                literal(keywords or [], ARRAY(String))
+            )
+        ).returning(UserNote.id)
+
+        note_id = self.db.execute(stmt).scalar_one()
         self.db.commit()
-        self.db.refresh(note)
-        return note
+        return note_id
 
-    def get_notes(self, user_paper_id: uuid.UUID) -> List[UserNote]:
-        """按用户论文ID获取笔记"""
-        stmt = select(UserNote).where(UserNote.user_paper_id == user_paper_id)
-        stmt = stmt.order_by(UserNote.created_at)
-        return self.db.execute(stmt).scalars().all()
+    def get_notes_by_user_file(self, user_id: uuid.UUID, file_hash: str, include_content: bool = True) -> List[Any]:
+        """
+        按用户和文件哈希获取笔记 (JOIN user_papers，一次往返，返回 Core 行元组)
+        列顺序: id, title, [content], keywords, created_at_iso, updated_at_iso
+        include_content=False 时只取摘要列 (不传输正文)
+        """
+        columns = [UserNote.id, UserNote.title]
+        if include_content:
+            columns.append(UserNote.content)
+        columns += [
+            UserNote.keywords,
+            _iso_utc(UserNote.created_at, "created_at_iso"),
+            _iso_utc(UserNote.updated_at, "updated_at_iso")
+        ]
+        stmt = select(*columns).join(UserPaper, UserNote.user_paper_id == UserPaper.id).where(
+            and_(UserPaper.user_id == user_id, UserPaper.file_hash == file_hash)
+        ).order_by(UserNote.created_at)
+        return self.db.execute(stmt).all()
 
     def update_note(self, note_id: int, title: str = None, content: str = None, keywords: List[str] = None):
         """更新笔记标题、内容或关键词"""
@@ -425,28 +484,53 @@ class SQLRepository:
         stmt = select(UserNote).where(UserNote.id == note_id)
         return self.db.execute(stmt).scalar_one_or_none()
 
+    def get_note_content(self, note_id: int, user_id: uuid.UUID) -> Optional[str]:
+        """获取指定用户名下某条笔记的正文 (不属于该用户时返回 None)"""
+        stmt = select(UserNote.content).join(UserPaper, UserNote.user_paper_id == UserPaper.id).where(
+            and_(UserNote.id == note_id, UserPaper.user_id == user_id)
+        )
+        return self.db.execute(stmt).scalar_one_or_none()
+
     # ==================== 高亮 ====================
 
-    def add_highlight(self, user_paper_id: uuid.UUID, page_number: int, rects: List[Dict], selected_text: str = None, color: str = "#FFFF00") -> UserHighlight:
-        """添加文本高亮记录"""
-        highlight = UserHighlight(
-            user_paper_id=user_paper_id,
-            page_number=page_number,
-            rects=rects, # JSONB
-            selected_text=selected_text,
-            color=color
-        )
-        self.db.add(highlight)
+    def add_highlights_bulk(self, user_paper_id: uuid.UUID, items: List[Dict]) -> List[int]:
+        """
+        批量添加高亮记录：单条多行 INSERT ... RETURNING id，一次提交
+        items: 包含 page_number, rects, selected_text, color 的字典列表
+        :return: 与 items 顺序一致的高亮 ID 列表
+        """
+        if not items:
+            return []
+        rows = [
+            {
+                "user_paper_id": user_paper_id,
+                "page_number": it.get("page_number"),
+                "rects": it.get("rects"),
+                "selected_text": it.get("selected_text"),
+                "color": it.get("color") or "#FFFF00",
+            }
+            for it in items
+        ]
+        stmt = insert(UserHighlight).returning(UserHighlight.id, sort_by_parameter_order=True)
+        ids = self.db.execute(stmt, rows).scalars().all()
         self.db.commit()
-        self.db.refresh(highlight)
-        return highlight
+        return list(ids)
 
-    def get_highlights(self, user_paper_id: uuid.UUID, page_number: Optional[int] = None) -> List[UserHighlight]:
-        """获取论文的高亮记录"""
-        stmt = select(UserHighlight).where(UserHighlight.user_paper_id == user_paper_id)
+    def get_highlights_by_user_file(self, user_id: uuid.UUID, file_hash: str, page_number: Optional[int] = None) -> List[Any]:
+        """
+        按用户和文件哈希获取高亮记录 (JOIN user_papers，一次往返，返回 Core 行元组)
+        列顺序: id, page_number, rects, selected_text, color, created_at_iso
+        """
+        stmt = select(
+            UserHighlight.id, UserHighlight.page_number, UserHighlight.rects,
+            UserHighlight.selected_text, UserHighlight.color,
+            _iso_utc(UserHighlight.created_at, "created_at_iso")
+        ).join(UserPaper, UserHighlight.user_paper_id == UserPaper.id).where(
+            and_(UserPaper.user_id == user_id, UserPaper.file_hash == file_hash)
+        )
         if page_number is not None:
             stmt = stmt.where(UserHighlight.page_number == page_number)
-        return self.db.execute(stmt).scalars().all()
+        return self.db.execute(stmt).all()
 
     def delete_highlight(self, highlight_id: int):
         """删除指定高亮记录"""
@@ -454,6 +538,23 @@ class SQLRepository:
         self.db.execute(stmt)
         self.db.commit()
         
+    def delete_highlights_bulk(self, user_id: uuid.UUID, highlight_ids: List[int]) -> int:
+        """
+        批量删除高亮：单条 DELETE ... WHERE id IN (...)，一次提交
+        只删除属于该用户的记录
+        :return: 实际删除的行数
+        """
+        if not highlight_ids:
+            return 0
+        owned_papers = select(UserPaper.id).where(UserPaper.user_id == user_id)
+        stmt = delete(UserHighlight).where(
+            UserHighlight.id.in_(highlight_ids),
+            UserHighlight.user_paper_id.in_(owned_papers)
+        )
+        result = self.db.execute(stmt)
+        self.db.commit()
+        return result.rowcount
+
     def update_highlight(self, highlight_id: int, color: str = None):
         """更新高亮颜色"""
         # Update logic if needed
@@ -16,6 +16,9 @@ class VectorRepository:
 
     def __init__(self):
         self.client = vector_db.qdrant
+        # 本进程内已确认存在的集合 / 已建立的 Payload 索引，避免每次写入前重复往返
+        self._ready_collections: set = set()
+        self._indexed_fields: set = set()
 
     @property
     def is_available(self) -> bool:
@@ -48,7 +51,10 @@ class VectorRepository:
 
     def create_collection(self, collection_name: str, vector_size: int = 1536):
         """初始化集合"""
-        if not self.is_available or self.client.collection_exists(collection_name):
+        if not self.is_available or collection_name in self._ready_collections:
+            return
+        if self.client.collection_exists(collection_name):
+            self._ready_collections.add(collection_name)
             return
             
         try:
@@ -65,6 +71,8 @@ class VectorRepository:
                 field_name="file_hash",
                 field_schema=models.PayloadSchemaType.KEYWORD
             )
+            self._ready_collections.add(collection_name)
+            self._indexed_fields.add((collection_name, "file_hash"))
             logger.info(f"Initialized collection: {collection_name}")
         except Exception as e:
             logger.error(f"Failed to create collection '{collection_name}': {e}")
@@ -72,6 +80,7 @@ class VectorRepository:
     def create_payload_index(self, collection_name: str, field_name: str, field_schema: Any = None):
         """在指定的 Payload 上建立索引"""
         if not self.is_available: return
+        if (collection_name, field_name) in self._indexed_fields: return
         if field_schema is None:
             field_schema = models.PayloadSchemaType.KEYWORD
             
@@ -81,16 +90,20 @@ class VectorRepository:
                 field_name=field_name,
                 field_schema=field_schema
             )
+            self._indexed_fields.add((collection_name, field_name))
             logger.info(f"Created payload index for '{field_name}' in '{collection_name}'.")
         except Exception as e:
-            # 如果已经存在会抛错，这属于预期情况
+            # 如果已经存在会抛错，这属于预期情况；同样记为已建立，避免之后每次重复请求
             logger.debug(f"Payload index '{field_name}' might already exist or failed: {e}")
+            self._indexed_fields.add((collection_name, field_name))
 
     def delete_collection(self, collection_name: str):
         """销毁整个集合（不可恢复）。"""
         if not self.is_available: return
         try:
             self.client.delete_collection(collection_name=collection_name)
+            self._ready_collections.discard(collection_name)
+            self._indexed_fields = {k for k in self._indexed_fields if k[0] != collection_name}
             logger.warning(f"Destroyed collection: {collection_name}")
         except Exception as e:
             logger.error(f"Failed to delete collection '{collection_name}': {e}")
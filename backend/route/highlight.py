@@ -1,5 +1,5 @@
 """
-高亮路由：保存/获取/删除/更新高亮
+高亮路由：保存(单条/批量)/获取/删除(单条/批量)/更新高亮
 """
 from flask import Blueprint, request, jsonify, current_app, g
 from core.security import jwt_required
@@ -8,6 +8,9 @@ from route.utils import HighlightLogic
 # 定义蓝图
 highlight_bp = Blueprint('highlight', __name__, url_prefix='/api/highlight')
 
+# 批量创建/删除单次上限：整批在一条 INSERT / DELETE 中执行
+MAX_BATCH_HIGHLIGHTS = 500
+
 
 # ==================== 路由接口 ====================
 
@@ -66,6 +69,69 @@ def create_highlight():
     })
 
 
+@highlight_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def create_highlights_batch():
+    """
+    批量创建高亮 (同一 PDF 的多条高亮一次写入)
+
+    Request Body:
+    {
+        "pdfId": "file_hash...",
+        "highlights": [
+            {
+                "page": 1,
+                "rects": [{"x": 100, "y": 100, "width": 50, "height": 20}],
+                "pageWidth": 800,
+                "pageHeight": 1200,
+                "text": "选中的文本内容",
+                "color": "#FFFF00"
+            }
+        ]
+    }
+    """
+    data = request.get_json()
+
+    # 1. 参数校验
+    if not data or not data.get('pdfId') or not isinstance(data.get('highlights'), list):
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    if len(data['highlights']) > MAX_BATCH_HIGHLIGHTS:
+        return jsonify({'error': f'Too many highlights (max {MAX_BATCH_HIGHLIGHTS})'}), 400
+
+    required_fields = ['page', 'rects', 'pageWidth', 'pageHeight']
+    if not all(isinstance(h, dict) and all(k in h for k in required_fields) for h in data['highlights']):
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    # 2. 坐标归一化
+    items = []
+    for h in data['highlights']:
+        items.append({
+            'page_number': h['page'],
+            'rects': HighlightLogic.normalize_coordinates(h['rects'], h['pageWidth'], h['pageHeight']),
+            'selected_text': h.get('text', ''),
+            'color': h.get('color', '#FFFF00'),
+        })
+
+    # 3. 持久化
+    note_svc = g.note_service
+    highlight_ids = note_svc.add_highlights_bulk(
+        user_id=g.user_id,
+        file_hash=data['pdfId'],
+        items=items
+    )
+
+    if highlight_ids is None:
+        return jsonify({'error': 'Paper not in user library'}), 404
+
+    return jsonify({
+        'success': True,
+        'ids': highlight_ids,
+        'rects': [it['rects'] for it in items],
+        'message': 'Highlights created'
+    })
+
+
 @highlight_bp.route('', methods=['GET'])
 @jwt_required()
 def get_highlights():
@@ -106,6 +172,30 @@ def delete_highlight(highlight_id):
     return jsonify({'success': True})
 
 
+@highlight_bp.route('/batch/delete', methods=['POST'])
+@jwt_required()
+def delete_highlights_batch():
+    """
+    批量删除高亮 (多选删除时一次请求完成)
+
+    Request Body:
+    {
+        "ids": [1, 2, 3]
+    }
+    """
+    data = request.get_json()
+    ids = data.get('ids') if data else None
+    # type(i) is int：排除 JSON true/false (bool 是 int 的子类)
+    if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    if len(ids) > MAX_BATCH_HIGHLIGHTS:
+        return jsonify({'error': f'Too many highlights (max {MAX_BATCH_HIGHLIGHTS})'}), 400
+
+    note_svc = g.note_service
+    deleted = note_svc.delete_highlights_bulk(user_id=g.user_id, highlight_ids=ids)
+    return jsonify({'success': True, 'deleted': deleted})
+
+
 @highlight_bp.route('/<int:highlight_id>', methods=['PUT'])
 @jwt_required()
 def update_highlight(highlight_id):
@@ -1,9 +1,10 @@
 """
 笔记相关路由
 1. 创建笔记
-2. 获取笔记列表
-3. 更新笔记
-4. 删除笔记
+2. 获取笔记列表 (可只取摘要)
+3. 获取单条笔记正文
+4. 更新笔记
+5. 删除笔记
 """
 import json
 from flask import Blueprint, request, jsonify, current_app, g
@@ -59,22 +60,28 @@ def create_note():
 def get_notes(pdf_id):
     """
     获取某 PDF 的所有笔记
+
+    Query Params:
+        summary: bool (可选, 为 true 时不返回 content，正文通过 /<note_id>/content 按需获取)
     """
     user_id = g.user_id
     note_service = g.note_service
+    summary = request.args.get('summary', 'false').lower() in ('1', 'true')
 
-    notes = note_service.get_notes(user_id=user_id, file_hash=pdf_id)
+    notes = note_service.get_notes(user_id=user_id, file_hash=pdf_id, include_content=not summary)
 
     formatted_notes = []
     for note in notes:
-        formatted_notes.append({
+        item = {
             'id': note['id'],
             'title': note.get('title') or '',
-            'content': note.get('content') or '',
             'keywords': note.get('keywords', []),
             'createdAt': note.get('created_at'),
             'updatedAt': note.get('updated_at'),
-        })
+        }
+        if not summary:
+            item['content'] = note.get('content') or ''
+        formatted_notes.append(item)
 
     return jsonify({
         'success': True,
@@ -83,6 +90,23 @@ def get_notes(pdf_id):
     })
 
 
+@notes_bp.route('/<int:note_id>/content', methods=['GET'])
+@jwt_required()
+def get_note_content(note_id):
+    """获取单条笔记正文"""
+    note_service = g.note_service
+    content = note_service.get_note_content(note_id, user_id=g.user_id)
+
+    if content is None:
+        return jsonify({'error': 'Note not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'id': note_id,
+        'content': content
+    })
+
+
 @notes_bp.route('/<int:note_id>', methods=['PUT'])
 @jwt_required()
 def update_note(note_id):
@@ -172,14 +172,16 @@ def get_pdf_paragraphs(pdf_id):
 def get_pdf_source(pdf_id):
     """
     获取 PDF 源文件流 (支持浏览器直接预览/渲染)
+    按路径发送: 由 WSGI 服务器零拷贝传输，并支持 Range / 条件请求 (304)
     """
     try:
-        file_obj = g.pdf_service.get_file_obj(pdf_id)
+        filepath = g.pdf_service.get_source_path(pdf_id)
         return send_file(
-            file_obj,
+            filepath,
             mimetype='application/pdf',
             as_attachment=False,
-            download_name=f"{pdf_id}.pdf"
+            download_name=f"{pdf_id}.pdf",
+            conditional=True
         )
     except FileNotFoundError:
         raise NotFoundError('PDF file not found')
\ No newline at end of file
@@ -8,6 +8,7 @@ import threading
 from datetime import datetime
 from typing import List, Dict, Optional, Any
 from repository.sql_repo import SQLRepository 
+from core.security import parse_user_id
 
 class ChatService:
     def __init__(self, db_repo: SQLRepository):
@@ -91,7 +92,9 @@ class ChatService:
 
     def get_session(self, session_id: str, user_id: str) -> Optional[Dict]:
         """获取单个会话详情"""
-        u_uuid = uuid.UUID(user_id) if user_id != 'default' else uuid.UUID('00000000-0000-0000-0000-000000000000')
+        u_uuid = user_id if isinstance(user_id, uuid.UUID) else parse_user_id(user_id)
+        if u_uuid is None:
+            return None
         session = self.repo.get_chat_session(uuid.UUID(session_id), u_uuid)
         
         if not session:
@@ -12,6 +12,7 @@ from sqlalchemy import select, desc, and_
 from core.database import db
 from repository.sql_repo import SQLRepository
 from model.db.doc_models import UserPaper
+from services.note_service import invalidate_user_paper_cache
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +50,7 @@ class LibraryService:
             if isinstance(user_id, str):
                 user_id = uuid.UUID(user_id)
             success = self._repo().delete_user_paper(user_id, pdf_id)
+            invalidate_user_paper_cache(user_id, pdf_id)
             return success
         except Exception as e:
             logger.error(f"Error deleting PDF {pdf_id} for user {user_id}: {e}")
@@ -137,17 +139,13 @@ class LibraryService:
         try:
             if isinstance(user_id, str):
                 user_id = uuid.UUID(user_id)
-            repo = self._repo()
-            user_paper = repo.get_user_paper(user_id, pdf_id)
-            if not user_paper:
-                return []
-            notes = repo.get_notes(user_paper.id)
+            notes = self._repo().get_notes_by_user_file(user_id, pdf_id)
             return [{
                 "id": n.id,
                 "content": n.content,
                 "keywords": n.keywords or [],
-                "createdAt": n.created_at.isoformat() if n.created_at else None,
-                "updatedAt": n.updated_at.isoformat() if n.updated_at else None
+                "createdAt": n.created_at_iso,
+                "updatedAt": n.updated_at_iso
             } for n in notes]
         except Exception as e:
             logger.error(f"Error getting notes for {pdf_id}: {e}")
@@ -2,14 +2,41 @@
 笔记 & 高亮 服务层：处理笔记和高亮的增删改查业务逻辑
 """
 import uuid
-import json
 import logging
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional
 from repository.sql_repo import SQLRepository
-from model.db.doc_models import UserNote, UserHighlight
+from utils.lru import BoundedLRU
 
 logger = logging.getLogger(__name__)
 
+# ==================== UserPaper ID 缓存 ====================
+# (user_id, file_hash) -> user_paper_id 的进程内 LRU。
+# UserPaper 的 id 创建后不变且默认只做软删除，只缓存"已存在"的结果，
+# 命中时可跳过 get_user_paper 查询；未命中仍走数据库。
+_USER_PAPER_CACHE_SIZE = 16384
+_user_paper_ids = BoundedLRU(_USER_PAPER_CACHE_SIZE)
+
+
+def _get_cached_user_paper_id(user_id: uuid.UUID, file_hash: str) -> Optional[uuid.UUID]:
+    return _user_paper_ids.get((user_id, file_hash))
+
+
+def _cache_user_paper_id(user_id: uuid.UUID, file_hash: str, user_paper_id: uuid.UUID):
+    _user_paper_ids.put((user_id, file_hash), user_paper_id)
+
+
+def invalidate_user_paper_cache(user_id: uuid.UUID, file_hash: str):
+    """UserPaper 被删除时移除缓存条目"""
+    _user_paper_ids.pop((user_id, file_hash))
+
+
+# 输出字典的键，顺序与 SQLRepository 查询的列顺序一致，
+# 行元组可直接 dict(zip(keys, row)) 转换，无需逐列按名取值
+_NOTE_KEYS = ("id", "title", "content", "keywords", "created_at", "updated_at")
+_NOTE_SUMMARY_KEYS = ("id", "title", "keywords", "created_at", "updated_at")
+_HIGHLIGHT_KEYS = ("id", "page", "rects", "text", "color", "created_at")
+
+
 class NoteService:
     def __init__(self, db_repo: SQLRepository):
         self.repo = db_repo
@@ -29,24 +56,18 @@ class NoteService:
         # 1. User ID
         u_uuid = user_id
 
-        # 2. 确保 UserPaper 存在
-        # 笔记必须关联到一个 UserPaper (用户书架上的书)
-        user_paper = self.repo.get_user_paper(u_uuid, file_hash)
-        if not user_paper:
-            logger.info(f"UserPaper not found for user {user_id} and file {file_hash}, creating new.")
-            # 如果没有标题，可以用默认值
-            user_paper = self.repo.create_user_paper(u_uuid, file_hash, title="Reference Document")
-
-        # 3. 保存到数据库
-        note = self.repo.add_note(
-            user_paper_id=user_paper.id,
+        # 2. 确保 UserPaper 存在并保存笔记 (单条 UPSERT + INSERT 语句)
+        # 笔记必须关联到一个 UserPaper (用户书架上的书)，不存在时以默认标题创建
+        note_id = self.repo.upsert_user_paper_and_add_note(
+            user_id=u_uuid,
+            file_hash=file_hash,
             content=content,
             title=title,
-            keywords=keywords or []
+            keywords=keywords
         )
-        
-        logger.info(f"Note created with ID: {note.id}")
-        return note.id
+
+        logger.info("Note created with ID: %s", note_id)
+        return note_id
 
     def delete_note(self, note_id: int) -> bool:
         """
@@ -56,10 +77,10 @@ class NoteService:
         """
         try:
             self.repo.delete_note(note_id)
-            logger.info(f"Note deleted: {note_id}")
+            logger.info("Note deleted: %s", note_id)
             return True
         except Exception as e:
-            logger.error(f"Error deleting note {note_id}: {e}")
+            logger.error("Error deleting note %s: %s", note_id, e)
             return False
 
     def update_note_content(self, note_id: int, title: Optional[str] = None, content: Optional[str] = None,  keywords: Optional[List[str]] = None) -> bool:
@@ -75,31 +96,27 @@ class NoteService:
         self.repo.update_note(note_id, title=title, content=content, keywords=keywords)
         return True
 
-    def get_notes(self, user_id: uuid.UUID, file_hash: str) -> List[Dict]:
+    def get_notes(self, user_id: uuid.UUID, file_hash: str, include_content: bool = True) -> List[Dict]:
         """
         获取用户针对某文件的所有笔记
+        :param include_content: False 时只返回摘要 (id/title/keywords/时间)，正文通过 get_note_content 按需获取
         :return: 笔记字典列表
         """
         u_uuid = user_id
-        
-        user_paper = self.repo.get_user_paper(u_uuid, file_hash)
-        if not user_paper:
-            return []
-
-        notes = self.repo.get_notes(user_paper.id)
-        
-        result = []
-        for n in notes:
-            result.append({
-                "id": n.id,
-                "title": n.title,
-                "content": n.content,
-                "keywords": n.keywords,
-                "created_at": n.created_at.isoformat() if n.created_at else None,
-                "updated_at": n.updated_at.isoformat() if n.updated_at else None,
-            })
-            
-        return result
+
+        # UserPaper 不存在时 JOIN 结果为空，自然返回 []
+        rows = self.repo.get_notes_by_user_file(u_uuid, file_hash, include_content=include_content)
+
+        # 时间字段已在 SQL 侧格式化为 ISO 字符串
+        keys = _NOTE_KEYS if include_content else _NOTE_SUMMARY_KEYS
+        return [dict(zip(keys, r)) for r in rows]
+
+    def get_note_content(self, note_id: int, user_id: uuid.UUID) -> Optional[str]:
+        """
+        按需获取单条笔记正文 (校验笔记属于该用户)
+        :return: 笔记正文，不存在或不属于该用户时返回 None
+        """
+        return self.repo.get_note_content(note_id, user_id)
 
     def get_note_by_id(self, note_id: int) -> Optional[Dict]:
         """
@@ -123,12 +140,17 @@ class NoteService:
     # ==================== 高亮 ====================
 
     def _resolve_user_paper_id(self, user_id: uuid.UUID, file_hash: str):
-        """内部辅助：解析 user_id (UUID)，查找 UserPaper 关联 ID"""
+        """内部辅助：解析 user_id (UUID)，查找 UserPaper 关联 ID (优先读进程内缓存)"""
         u_uuid = user_id
-        
+
+        cached = _get_cached_user_paper_id(u_uuid, file_hash)
+        if cached is not None:
+            return cached
+
         user_paper = self.repo.get_user_paper(u_uuid, file_hash)
         if not user_paper:
             return None
+        _cache_user_paper_id(u_uuid, file_hash, user_paper.id)
         return user_paper.id
 
     def add_highlight(self, user_id: uuid.UUID, file_hash: str,
@@ -146,18 +168,44 @@ class NoteService:
         """
         user_paper_id = self._resolve_user_paper_id(user_id, file_hash)
         if not user_paper_id:
-            logger.warning(f"UserPaper not found: user={user_id}, file={file_hash}")
+            logger.warning("UserPaper not found: user=%s, file=%s", user_id, file_hash)
             return None
 
-        highlight = self.repo.add_highlight(
-            user_paper_id=user_paper_id,
-            page_number=page_number,
-            rects=rects,
-            selected_text=selected_text,
-            color=color
-        )
-        logger.info(f"Highlight created: id={highlight.id}")
-        return highlight.id
+        [highlight_id] = self.add_highlights_for_paper(user_paper_id, [{
+            "page_number": page_number,
+            "rects": rects,
+            "selected_text": selected_text,
+            "color": color,
+        }])
+        logger.info("Highlight created: id=%s", highlight_id)
+        return highlight_id
+
+    def add_highlights_for_paper(self, user_paper_id: uuid.UUID, items: List[Dict]) -> List[int]:
+        """
+        在已解析的 UserPaper 下批量添加高亮 (单条 INSERT ... RETURNING，一次提交)
+        :param user_paper_id: 已解析的 UserPaper ID
+        :param items:     [{page_number, rects, selected_text, color}, ...]
+        :return: 与 items 顺序一致的高亮记录 ID 列表
+        """
+        return self.repo.add_highlights_bulk(user_paper_id, items)
+
+    def add_highlights_bulk(self, user_id: uuid.UUID, file_hash: str,
+                            items: List[Dict]) -> Optional[List[int]]:
+        """
+        批量添加高亮 (UserPaper 只解析一次，所有记录一次提交)
+        :param user_id:   用户 ID (UUID)
+        :param file_hash: PDF 文件哈希
+        :param items:     [{page_number, rects, selected_text, color}, ...]
+        :return: 高亮记录 ID 列表；UserPaper 不存在时返回 None
+        """
+        user_paper_id = self._resolve_user_paper_id(user_id, file_hash)
+        if not user_paper_id:
+            logger.warning("UserPaper not found: user=%s, file=%s", user_id, file_hash)
+            return None
+
+        ids = self.add_highlights_for_paper(user_paper_id, items)
+        logger.info("Highlights created: count=%s", len(ids))
+        return ids
 
     def get_highlights(self, user_id: uuid.UUID, file_hash: str,
                        page_number: Optional[int] = None) -> List[Dict]:
@@ -165,39 +213,34 @@ class NoteService:
         获取高亮列表
         :return: 高亮字典列表
         """
-        user_paper_id = self._resolve_user_paper_id(user_id, file_hash)
-        if not user_paper_id:
-            return []
-
-        highlights = self.repo.get_highlights(user_paper_id, page_number=page_number)
-
-        return [
-            {
-                "id": h.id,
-                "page": h.page_number,
-                "rects": h.rects,
-                "text": h.selected_text,
-                "color": h.color,
-                "created_at": h.created_at.isoformat() if h.created_at else None,
-            }
-            for h in highlights
-        ]
+        rows = self.repo.get_highlights_by_user_file(user_id, file_hash, page_number=page_number)
+
+        return [dict(zip(_HIGHLIGHT_KEYS, r)) for r in rows]
 
     def delete_highlight(self, highlight_id: int) -> bool:
         """删除高亮"""
         try:
             self.repo.delete_highlight(highlight_id)
-            logger.info(f"Highlight deleted: {highlight_id}")
+            logger.info("Highlight deleted: %s", highlight_id)
             return True
         except Exception as e:
-            logger.error(f"Error deleting highlight {highlight_id}: {e}")
+            logger.error("Error deleting highlight %s: %s", highlight_id, e)
             return False
 
+    def delete_highlights_bulk(self, user_id: uuid.UUID, highlight_ids: List[int]) -> int:
+        """
+        批量删除高亮 (单条 DELETE，一次往返)
+        :return: 实际删除的数量
+        """
+        deleted = self.repo.delete_highlights_bulk(user_id, highlight_ids)
+        logger.info("Highlights deleted: count=%s", deleted)
+        return deleted
+
     def update_highlight(self, highlight_id: int, color: Optional[str] = None) -> bool:
         """更新高亮颜色"""
         try:
             self.repo.update_highlight(highlight_id, color=color)
             return True
         except Exception as e:
-            logger.error(f"Error updating highlight {highlight_id}: {e}")
+            logger.error("Error updating highlight %s: %s", highlight_id, e)
             return False
@@ -14,16 +14,69 @@ import uuid
 import logging
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
-import shutil
 
 from core.database import db
 from repository.sql_repo import SQLRepository
 from repository.object_repo import object_storage
 from utils import pdf_engine
-from utils.hashing import calculate_stream_hash
+from utils.hashing import hash_and_tee
+from utils.lru import BoundedLRU
 
 logger = logging.getLogger(__name__)
 
+
+# ==================== 文件路径缓存 ====================
+# pdf_id -> 本地路径 的进程内 TTL LRU。PdfService 按请求创建，
+# 放在模块级才能跨请求复用；命中时只需一次 exists 检查，跳过目录查找与 COS 下载。
+_FILEPATH_CACHE_SIZE = 4096
+_FILEPATH_CACHE_TTL = 300
+_filepaths = BoundedLRU(_FILEPATH_CACHE_SIZE, ttl=_FILEPATH_CACHE_TTL)
+
+
+def _get_cached_filepath(pdf_id: str):
+    """命中时确认文件仍在磁盘上，已被清理则移除条目并视为未命中"""
+    path = _filepaths.get(pdf_id)
+    if path is not None and not os.path.exists(path):
+        _filepaths.pop(pdf_id)
+        return None
+    return path
+
+
+def _cache_filepath(pdf_id: str, path: str):
+    _filepaths.put(pdf_id, path)
+
+
+# ==================== 已完成进度缓存 ====================
+# pdf_id -> (current_page, total_pages)。completed 是终态 (上传查重遇到 completed 直接返回，
+# 不会重新分发)，缓存无需失效；命中后轮询可跳过 GlobalFile 查询。
+_COMPLETED_CACHE_SIZE = 4096
+_completed_progress = BoundedLRU(_COMPLETED_CACHE_SIZE)
+
+
+def _get_completed_progress(pdf_id: str):
+    return _completed_progress.get(pdf_id)
+
+
+def _cache_completed_progress(pdf_id: str, current_page: int, total_pages: int):
+    _completed_progress.put(pdf_id, (current_page, total_pages))
+
+
+def _bbox_to_obj(raw) -> dict | None:
+    """[x, y, w, h] -> {x0, y0, x1, y1, width, height}，只读一次列值并一次解包"""
+    if not raw or not isinstance(raw, list) or len(raw) < 4:
+        return None
+    x, y, w, h = raw[:4]
+    return {"x0": x, "y0": y, "x1": x + w, "y1": y + h, "width": w, "height": h}
+
+
+def _remove_quietly(path: str):
+    """删除临时文件，忽略不存在等错误"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 class PdfService:
     def __init__(self, upload_folder: str):
         """
@@ -32,7 +85,6 @@ class PdfService:
             upload_folder: PDF 文件本地缓存/上传目录
         """
         self.upload_folder = upload_folder
-        self.pdf_registry: dict[str, dict] = {}
         
         # 确保上传目录存在
         os.makedirs(self.upload_folder, exist_ok=True)
@@ -42,17 +94,17 @@ class PdfService:
     def _find_filepath_by_id(self, pdf_id: str) -> str:
         """
         根据 ID (Hash) 查找本地文件路径。
-        策略: 内存注册表 -> 本地磁盘 -> COS 下载
+        策略: 进程内路径缓存 -> 本地磁盘 -> COS 下载
         """
-        # 1. 查内存注册表
-        if pdf_id in self.pdf_registry:
-            path = self.pdf_registry[pdf_id]['filepath']
-            if os.path.exists(path):
-                return path
+        # 1. 查路径缓存
+        cached = _get_cached_filepath(pdf_id)
+        if cached:
+            return cached
 
         # 2. 查本地磁盘 (uploads/<pdf_id>)
         candidate = os.path.join(self.upload_folder, pdf_id)
         if os.path.exists(candidate):
+            _cache_filepath(pdf_id, candidate)
             return candidate
 
         # 3. 如果启用 COS，尝试下载到本地
@@ -61,6 +113,7 @@ class PdfService:
                 # COS Key 是 pdffile/{pdf_id}
                 if object_storage.download_file(f"pdffile/{pdf_id}", candidate):
                     logger.info(f"Downloaded {pdf_id} from COS to {candidate}")
+                    _cache_filepath(pdf_id, candidate)
                     return candidate
             except Exception as e:
                 logger.warning(f"Failed to download {pdf_id} from COS: {e}")
@@ -74,6 +127,19 @@ class PdfService:
             return filepath
         raise FileNotFoundError(f"PDF file not found locally or in storage: {pdf_id}")
 
+    def _place_upload(self, tmp_path: str, filepath: str):
+        """上传临时文件落盘：目标不存在时原子重命名，已存在则丢弃临时文件"""
+        if os.path.exists(filepath):
+            _remove_quietly(tmp_path)
+            return
+        try:
+            os.replace(tmp_path, filepath)
+            logger.info(f"[Ingest] Saved file to {filepath}")
+        except Exception as e:
+            logger.error(f"[Ingest] Failed to save local file {filepath}: {e}")
+            _remove_quietly(tmp_path)
+            raise e
+
     # ===================== 文件处理异步 =====================
     def ingest_file(self, file_obj, filename: str, user_id: uuid.UUID = None) -> dict:
         """
@@ -92,13 +158,21 @@ class PdfService:
         
         STUCK_TIMEOUT_MINUTES = 120  
         
-        # 1. 计算文件基础属性
+        # 1. 计算文件基础属性 (单次读取：边算 Hash 边写入临时文件)
         if hasattr(file_obj, 'seek'):
             file_obj.seek(0)
-        file_hash = calculate_stream_hash(file_obj)
+        tmp_path = os.path.join(self.upload_folder, f".{uuid.uuid4().hex}.part")
+        try:
+            with open(tmp_path, "wb") as tmp:
+                file_hash = hash_and_tee(file_obj, tmp)
+                file_size = tmp.tell()
+        except Exception:
+            _remove_quietly(tmp_path)
+            raise
         
         pdf_id = file_hash
         safe_filename = secure_filename(filename)
+        filepath = os.path.join(self.upload_folder, pdf_id)
         
         # 2. 检查 GlobalFile 状态 (查重)
         repo = SQLRepository(db.session)
@@ -119,6 +193,11 @@ class PdfService:
                 # 任务已完成，或者正在处理且未卡死：直接返回
                 if is_completed or (is_processing and not is_stuck):
                     logger.info(f"[Ingest] File {pdf_id} exists (status={gf.process_status}). Instant return.")
+                    # 本地缺失 (如换节点/磁盘清理) 时留下刚上传的副本，后续读取无需再从 COS 下载
+                    try:
+                        self._place_upload(tmp_path, filepath)
+                    except Exception:
+                        pass  # 仅为本地缓存，失败不影响返回
                     return {
                         "pdf_id": pdf_id,
                         "task_id": gf.task_id,
@@ -130,52 +209,41 @@ class PdfService:
                 logger.info(f"[Ingest] File {pdf_id} status={gf.process_status} (stuck/failed), re-dispatching...")
         except Exception as e:
             db.session.rollback()
+            _remove_quietly(tmp_path)
             raise
 
-        # 3. 物理保存到本地
-        filepath = os.path.join(self.upload_folder, pdf_id)
-        if not os.path.exists(filepath):
-            try:
-                if hasattr(file_obj, 'seek'):
-                    file_obj.seek(0)
-                with open(filepath, "wb") as f:
-                    shutil.copyfileobj(file_obj, f)
-                logger.info(f"[Ingest] Saved file to {filepath}")
-            except Exception as e:
-                logger.error(f"[Ingest] Failed to save local file {filepath}: {e}")
-                raise e
-        
-        # Get file size for DB record
-        file_size = os.path.getsize(filepath)
+        # 3. 物理保存到本地 (临时文件原子重命名；已存在则丢弃临时文件)
+        self._place_upload(tmp_path, filepath)
         
-        # 4. 上传到 COS
+        # 4. 上传到 COS (Worker 不共享本地存储，需在分发任务前完成)
         if object_storage.config.enabled:
-            try:
-                # 注意：这里需要重新打开文件流或使用 bytes
-                with open(filepath, 'rb') as f:
-                    object_storage.upload_file(f, f"pdffile/{pdf_id}")
-            except Exception as e:
-                logger.error(f"[Ingest] COS upload failed (continuing): {e}")
+            if not object_storage.upload_local_file(filepath, f"pdffile/{pdf_id}"):
+                logger.error(f"[Ingest] COS upload failed for {pdf_id} (continuing)")
 
         # 5. 获取页数和元数据
-        page_count = 0
-        metadata = {}
-        dimensions = []
-        try:
-            pdf_info = pdf_engine.get_pdf_info(pdf_id, filepath)
-            page_count = pdf_info.get('pageCount', 0)
-            metadata = pdf_info.get('metadata', {})
-            dimensions = pdf_info.get('dimensions', [])
-        except Exception:
-            pass
+        # 重新分发 (卡死/失败) 时 GlobalFile 已有元数据，直接复用，不再解析 PDF
+        if gf and gf.total_pages:
+            page_count = gf.total_pages
+            metadata = gf.metadata_info or {}
+            dimensions = gf.dimensions or []
+        else:
+            page_count = 0
+            metadata = {}
+            dimensions = []
+            try:
+                pdf_info = pdf_engine.get_pdf_info(pdf_id, filepath)
+                page_count = pdf_info.get('pageCount', 0)
+                metadata = pdf_info.get('metadata', {})
+                dimensions = pdf_info.get('dimensions', [])
+            except Exception:
+                pass
             
         # 准备新的 Task ID
         new_task_id = str(uuid.uuid4())
         
-        # 6. 更新 GlobalFile (Pending)
-        repo = SQLRepository(db.session)
+        # 6. 更新 GlobalFile (Pending)，复用第 2 步查到的记录，不再重复查询
+        created = True
         try:
-            gf = repo.get_global_file(pdf_id)
             if gf:
                 # 重置旧任务状态
                 gf.process_status = "pending"
@@ -187,22 +255,35 @@ class PdfService:
                 gf.updated_at = datetime.now()
                 gf.task_id = new_task_id
             else:
-                # 创建新任务
-                gf = repo.create_global_file(
+                # 创建新任务 (与 task_id 一起在下面一次提交；并发插入冲突时不抛错)
+                created = repo.add_global_file(
                     file_hash=pdf_id,
                     file_path=pdf_id,
                     file_size=file_size,
                     total_pages=page_count,
                     metadata=metadata,
                     dimensions=dimensions,
+                    task_id=new_task_id,
                 )
-                gf.task_id = new_task_id
             db.session.commit()
         except Exception as e:
             db.session.rollback()
             logger.error(f"[Ingest] DB transaction failed: {e}")
             raise e
 
+        if not created:
+            # 并发的首次上传已创建记录并分发任务：按查重命中返回
+            gf = repo.get_global_file(pdf_id)
+            logger.info(f"[Ingest] File {pdf_id} registered concurrently (status={gf.process_status}). Instant return.")
+            _cache_filepath(pdf_id, filepath)
+            return {
+                "pdf_id": pdf_id,
+                "task_id": gf.task_id,
+                "status": gf.process_status,
+                "pageCount": gf.total_pages or 0,
+                "is_new": False
+            }
+
         # 7. 启动 Celery 异步处理
         try:
             process_pdf.apply_async(
@@ -220,11 +301,8 @@ class PdfService:
                 db.session.commit()
             raise e
 
-        # 更新内存缓存
-        self.pdf_registry[pdf_id] = {
-            'id': pdf_id,
-            'filepath': filepath
-        }
+        # 更新路径缓存
+        _cache_filepath(pdf_id, filepath)
         return {
             "pdf_id": pdf_id,
             "task_id": new_task_id,
@@ -253,19 +331,29 @@ class PdfService:
         """
         repo = SQLRepository(db.session)
         try:
-            progress = repo.get_process_progress(pdf_id)
-            if not progress:
-                return {"status": "not_found", "error": "PDF not found"}
+            completed = _get_completed_progress(pdf_id)
+            if completed:
+                # 已完成：进度不会再变化，跳过 GlobalFile 查询
+                status = "completed"
+                current_page, total_pages = completed
+                error_msg = None
+            else:
+                progress = repo.get_process_progress(pdf_id)
+                if not progress:
+                    return {"status": "not_found", "error": "PDF not found"}
 
-            status = progress["status"]
-            current_page = progress["current_page"]
-            total_pages = progress["total_pages"]
-            error_msg = progress.get("error")
+                status = progress["status"]
+                current_page = progress["current_page"]
+                total_pages = progress["total_pages"]
+                error_msg = progress.get("error")
+                if status == "completed":
+                    _cache_completed_progress(pdf_id, current_page, total_pages)
 
             paragraphs = []
             if current_page > 0 and from_page <= current_page:
                 db_paras = repo.get_paragraphs_range(pdf_id, from_page, current_page)
-                paragraphs = [self._format_paragraph(p, pdf_id) for p in db_paras]
+                id_prefix = pdf_engine.paragraph_id_prefix(pdf_id)
+                paragraphs = [self._format_paragraph(p, id_prefix) for p in db_paras]
 
             return {
                 "status": status,
@@ -279,31 +367,22 @@ class PdfService:
             logger.error(f"Failed to get process status for {pdf_id}: {e}")
             return {"status": "error", "error": str(e)}
 
-    def _format_paragraph(self, p, pdf_id: str) -> dict:
-        """格式化段落数据"""
-        para_id = pdf_engine.make_paragraph_id(pdf_id, p.page_number, p.paragraph_index)
+    def _format_paragraph(self, p, id_prefix: str) -> dict:
+        """
+        格式化段落数据
+        id_prefix: pdf_engine.paragraph_id_prefix(pdf_id)，由调用方对整批段落计算一次
+        """
+        page_number = p.page_number
 
         # 将数据库中 [x, y, w, h] 格式转换为前端期望的具名字段对象
         # 数据库列: bbox JSONB comment="[x, y, w, h] 归一化坐标"
         # 前端类型: { x0, y0, x1, y1, width, height }
-        bbox = None
-        if p.bbox and isinstance(p.bbox, list) and len(p.bbox) >= 4:
-            x, y, w, h = p.bbox[0], p.bbox[1], p.bbox[2], p.bbox[3]
-            bbox = {
-                "x0": x,
-                "y0": y,
-                "x1": x + w,
-                "y1": y + h,
-                "width": w,
-                "height": h,
-            }
-
         return {
-            "id": para_id,
-            "page": p.page_number,
-            "bbox": bbox,
+            "id": f"{id_prefix}{page_number}_{p.paragraph_index}",
+            "page": page_number,
+            "bbox": _bbox_to_obj(p.bbox),
             "content": p.original_text,
-            "wordCount": len(p.original_text.split()) if p.original_text else 0,
+            "wordCount": p.word_count if p.word_count is not None else len(p.original_text.split()),
             "translation": p.translation_text,
         }
 
@@ -347,22 +426,20 @@ class PdfService:
         try:
             db_paras = repo.get_paragraphs(pdf_id, pagenumber, paraid)
             if db_paras:
+                id_prefix = pdf_engine.paragraph_id_prefix(pdf_id)
                 for p in db_paras:
-                    paragraphs.append(self._format_paragraph(p, pdf_id))
+                    paragraphs.append(self._format_paragraph(p, id_prefix))
         except Exception as e:
             logger.warning(f"DB lookup paragraphs failed for {pdf_id}: {e}")
 
         return paragraphs
 
-    def get_file_obj(self, pdf_id: str):
+    def get_source_path(self, pdf_id: str) -> str:
         """
-        根据 pdf_id 获取文件对象 (二进制流)
-        Returns:
-            file_object: 打开的文件对象 (rb模式)，调用者需负责关闭
+        根据 pdf_id 获取可直接发送的源文件路径
+        (路由用 send_file(path) 发送，走 wsgi.file_wrapper/sendfile 并支持 Range 请求)
         """
-        filepath = self.get_filepath(pdf_id)
-        return open(filepath, 'rb')
-    
+        return self.get_filepath(pdf_id)
 
     # ================= 图片 ========================
 
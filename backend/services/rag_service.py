@@ -3,6 +3,7 @@ RAG Service - 为用户论文库提供上下文检索
 """
 import re
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional, Any
 
 from core.config import settings
@@ -25,6 +26,9 @@ class RAGService:
     """
     
     COLLECTION_NAME = "paper_collection"
+    # 向量化分批：每批一次 HTTP 请求，多批并发发出
+    EMBED_BATCH_SIZE = 128
+    EMBED_MAX_WORKERS = 4
 
     def __init__(self):
         """
@@ -78,6 +82,20 @@ class RAGService:
                 'error': str(e)
             }
     
+    def _embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        分批并发生成 Embeddings，结果顺序与 texts 一致
+        单批时直接调用，不创建线程池
+        """
+        size = self.EMBED_BATCH_SIZE
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        if len(batches) <= 1:
+            return self.embeddings.embed_documents(texts)
+
+        with ThreadPoolExecutor(max_workers=min(self.EMBED_MAX_WORKERS, len(batches))) as pool:
+            results = pool.map(self.embeddings.embed_documents, batches)
+            return [vector for batch in results for vector in batch]
+
     def store_chunks(self, 
                      file_hash: str, 
                      chunks: List[Dict],
@@ -171,7 +189,7 @@ class RAGService:
                         }
             
             # 2. 生成 Embeddings
-            embeddings = self.embeddings.embed_documents(texts)
+            embeddings = self._embed_documents(texts)
             
             # Update metadata with user_ids
             for meta in metadatas:
@@ -93,7 +93,8 @@ def process_pdf(self, file_hash: str, upload_folder: str, filename: str, page_co
                     try:
                         paras_to_save = [
                             {"page_number": p["page"], "paragraph_index": p["index"],
-                             "original_text": p["content"], "bbox": p["bbox"]}
+                             "original_text": p["content"], "bbox": p["bbox"],
+                             "word_count": p["wordCount"]}
                             for p in paragraphs
                         ]
                         repo.save_paragraphs(file_hash, paras_to_save)
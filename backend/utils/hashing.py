@@ -1,9 +1,13 @@
 import hashlib
 
-def calculate_stream_hash(stream) -> str:
-    """计算文件流的 SHA256 Hash"""
+# 单次读取块大小：大块减少 read 系统调用次数
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_and_tee(src, dst, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """单次读取源流：边计算 SHA256 边写入 dst，返回 Hash"""
     sha256 = hashlib.sha256()
-    for chunk in iter(lambda: stream.read(8192), b""):
+    for chunk in iter(lambda: src.read(chunk_size), b""):
         sha256.update(chunk)
-    stream.seek(0)
+        dst.write(chunk)
     return sha256.hexdigest()
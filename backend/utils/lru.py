@@ -0,0 +1,86 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class BoundedLRU:
+    """
+    线程安全的有界 LRU 缓存 (进程内，跨请求复用)
+    - maxsize: 条目上限，超出时淘汰最久未使用的条目
+    - ttl:     可选，条目写入后的存活秒数，过期条目在读取时移除
+    - on_evict: 可选，条目因容量/过期被移除时回调 on_evict(key, value)，在锁外调用
+    显式 pop 视为调用方主动失效，不触发 on_evict
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def _trim(self) -> list:
+        """移除超出容量的条目 (须持锁调用)，返回被淘汰的 (key, value)"""
+        evicted = []
+        while len(self._data) > self.maxsize:
+            key, (value, _) = self._data.popitem(last=False)
+            evicted.append((key, value))
+        return evicted
+
+    def _notify(self, evicted: list):
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        evicted = []
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, stored_at = entry
+            if self._expired(stored_at):
+                del self._data[key]
+                evicted.append((key, value))
+                value = default
+            else:
+                self._data.move_to_end(key)
+        self._notify(evicted)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            evicted = self._trim()
+        self._notify(evicted)
+
+    def setdefault(self, key: Hashable, value: Any) -> Any:
+        """key 已存在 (未过期) 时返回已有值，否则写入 value 并返回；并发写入时以先写入者为准"""
+        evicted = []
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._data.move_to_end(key)
+                return entry[0]
+            if entry is not None:
+                evicted.append((key, entry[0]))
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            evicted.extend(self._trim())
+        self._notify(evicted)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
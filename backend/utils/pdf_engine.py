@@ -1,10 +1,20 @@
+import os
+import functools
+import threading
+from contextlib import contextmanager
 import fitz  # PyMuPDF
 import base64
 
+from utils.lru import BoundedLRU
+
 # =============== ID 生成/解析 =============
 def make_paragraph_id(pdf_id: str, page_number: int, index: int) -> str:
     """生成确定的段落ID"""
-    return f"pdf_chk_{pdf_id[:8]}_{page_number}_{index}"
+    return f"{paragraph_id_prefix(pdf_id)}{page_number}_{index}"
+
+def paragraph_id_prefix(pdf_id: str) -> str:
+    """段落ID的文件前缀，批量生成ID时只需计算一次"""
+    return f"pdf_chk_{pdf_id[:8]}_"
 
 def parse_paragraph_id(para_id: str) -> dict:
      """解析段落ID"""
@@ -35,10 +45,66 @@ def parse_image_id(image_id: str) -> tuple[str, int]:
     pdf_id, index_str = parts
     return pdf_id, int(index_str)
 
+# =============== 文档缓存 =============
+
+# 已打开文档的 LRU：(路径, mtime) -> (Document, 文档锁)
+# 逐页解析时避免每页重复 fitz.open (解析 xref 与页树)
+_DOC_CACHE_SIZE = 16
+
+
+def _close_evicted(key, entry):
+    """淘汰时关闭文档：等持有文档锁的使用方退出后再 close，释放文件句柄"""
+    doc, doc_lock = entry
+    with doc_lock:
+        doc.close()
+
+
+_open_docs = BoundedLRU(_DOC_CACHE_SIZE, on_evict=_close_evicted)
+
+@contextmanager
+def opened(filepath: str):
+    """
+    获取共享的已打开文档，退出时不关闭 (保留在 LRU 中，淘汰时关闭)
+    同一文档的使用方按文档锁串行：fitz.Document 不支持多线程并发访问
+    """
+    key = (filepath, os.stat(filepath).st_mtime_ns)
+    while True:
+        entry = _open_docs.get(key)
+        if entry is None:
+            doc = fitz.open(filepath)
+            entry = _open_docs.setdefault(key, (doc, threading.Lock()))
+            if entry[0] is not doc:
+                # 并发打开时以先写入者为准，关闭多余的句柄
+                doc.close()
+        doc, doc_lock = entry
+        with doc_lock:
+            # 取到条目后、加锁前可能已被淘汰关闭，重新获取
+            if doc.is_closed:
+                continue
+            yield doc
+            return
+
 # =============== PDF解析 =============
 
-def get_pdf_info(pdf_id: str, filepath: str) -> dict:
-    """获取PDF基本信息"""
+# 段落解析的文本提取选项：不保留原始空白 (清洗时本就会归一化)；
+# 保留连字与未知字符 CID，与默认输出一致。行尾连字符由清洗步骤统一合并
+_BLOCK_TEXT_FLAGS = (
+    fitz.TEXT_PRESERVE_LIGATURES
+    | fitz.TEXT_MEDIABOX_CLIP
+    | fitz.TEXT_CID_FOR_UNKNOWN_UNICODE
+)
+
+# 段落最少词数 (稍微放宽限制)；n 个词至少需要 2n-1 个字符，更短的碎片无需分词
+_MIN_PARAGRAPH_WORDS = 5
+_MIN_PARAGRAPH_CHARS = 2 * _MIN_PARAGRAPH_WORDS - 1
+
+@functools.lru_cache(maxsize=128)
+def _read_pdf_info(filepath: str, mtime_ns: int) -> dict:
+    """
+    读取页数/元数据/页面尺寸
+    以 (路径, mtime) 为键缓存：文件内容寻址不变，mtime 变化时自动失效
+    """
+    # 直接打开并关闭，不占用文档缓存 (Web 进程只读元数据，无需常驻句柄)
     doc = fitz.open(filepath)
     try:
         # 获取每一页的尺寸
@@ -49,24 +115,24 @@ def get_pdf_info(pdf_id: str, filepath: str) -> dict:
                 "width": rect.width,
                 "height": rect.height
             })
-            
-        info = {
-            'id': pdf_id,
+
+        return {
             'pageCount': len(doc),
             'metadata': doc.metadata,
             'dimensions': dimensions
         }
-        return info
     finally:
         doc.close()
 
+def get_pdf_info(pdf_id: str, filepath: str) -> dict:
+    """获取PDF基本信息"""
+    info = _read_pdf_info(filepath, os.stat(filepath).st_mtime_ns)
+    # 浅拷贝：调用方拿到独立的顶层字典，缓存内容不被修改
+    return {'id': pdf_id, **info}
+
 def get_page_count(filepath: str) -> int:
     """获取PDF页数"""
-    doc = fitz.open(filepath)
-    try:
-        return len(doc)
-    finally:
-        doc.close()
+    return _read_pdf_info(filepath, os.stat(filepath).st_mtime_ns)['pageCount']
 
 
 
@@ -79,10 +145,9 @@ def parse_paragraphs(filepath: str, pdf_id: str, page_numbers: list[int] = None)
         pdf_id: PDF ID
         page_numbers: 可选，指定要解析的页码列表 (从1开始)
     """
-    doc = fitz.open(filepath)
     paragraphs = []
     
-    try:
+    with opened(filepath) as doc:
         if page_numbers:
             pages_to_process = [p - 1 for p in page_numbers if 1 <= p <= len(doc)]
         else:
@@ -98,25 +163,26 @@ def parse_paragraphs(filepath: str, pdf_id: str, page_numbers: list[int] = None)
             footer_threshold = page_height - 50
 
             # 尝试按照阅读顺序排序文本块
-            blocks = page.get_text("blocks", sort=True)
+            blocks = page.get_text("blocks", sort=True, flags=_BLOCK_TEXT_FLAGS)
             
             for block in blocks:
                 # block 结构: (x0, y0, x1, y1, text, block_no, block_type)
                 x0, y0, x1, y1, text, block_no, block_type = block
                 
-                # 只处理文本。
-                if block_type != 0:
-                    continue
-
-                # 如果文本块完全位于顶部或底部区域，视为噪音
-                if y1 < header_threshold or y0 > footer_threshold:
+                # 只处理文本；完全位于顶部或底部区域的文本块视为噪音
+                # (先做廉价的坐标比较，被过滤的块不做文本清洗)
+                if block_type != 0 or y1 < header_threshold or y0 > footer_threshold:
                     continue
                 
                 # 文本清洗
                 clean_text = text.replace('-\n', '').replace('\n', ' ').strip()
                 
-                # 忽略过短的非实质性文本碎片
-                if len(clean_text.split()) < 5:  # 稍微放宽限制
+                # 忽略过短的非实质性文本碎片 (页码、图注编号等先按长度排除)
+                if len(clean_text) < _MIN_PARAGRAPH_CHARS:
+                    continue
+                # 分词一次，过滤与词数共用
+                word_count = len(clean_text.split())
+                if word_count < _MIN_PARAGRAPH_WORDS:
                     continue
 
                 # 生成确定性的段落ID，方便前端定位
@@ -129,10 +195,8 @@ def parse_paragraphs(filepath: str, pdf_id: str, page_numbers: list[int] = None)
                     "index": block_no,
                     "bbox": [x0, y0, x1 - x0, y1 - y0], # x, y, w, h
                     "content": clean_text,
-                    "wordCount": len(clean_text.split())
+                    "wordCount": word_count
                 })
-    finally:
-        doc.close()
     
     return paragraphs
 